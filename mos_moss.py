@@ -1,5 +1,7 @@
 import argparse
-import glob
+import functools
+import io
+import itertools
 import logging
 import logging.handlers
 import os
@@ -7,29 +9,49 @@ import pprint
 import random
 import re
 import shutil
+import subprocess
 import sys
+import tempfile
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
 
 import mosspy
 
+try:
+    import libarchive
+except ImportError:  # Optional, only used to speed up extraction.
+    libarchive = None
+
 # Set your MOSS ID here or in your environment variable.
 MOSS_ID = "1234"
 
 LANGUAGE_EXTENSIONS: dict[str, list[str]] = {
-    "java": ["java"],
+    "java": [".java"],
     "cpp": [".cpp", ".h", ".hpp"],
 }
+_LANGUAGE_EXTENSION_SETS = {language: frozenset(exts) for language, exts in LANGUAGE_EXTENSIONS.items()}
+
+# Never sent to MOSS, even if a language lists them.
+IGNORED_EXTENSIONS = (".pdf", ".jar")
+
+# Build output, IDE and VCS folders commonly left in student ZIPs. Never descended into.
+SKIP_DIRS = frozenset({"__MACOSX", ".git", "bin", "target", "build", "out", "node_modules"})
+
+# Canvas ZIP name format (may contain -i
+# at the end for resubmissions, where i is the attempt number):
+# <last><first>_<canvas_id>_<sis_id>_<original_filename>[-i]
+_CANVAS_RE = re.compile(r"(\w+_\w*_\d+)_(.+)\.")
 
 log = logging.getLogger()
 
 
-def cleanup_files(path):
-    """Currently just removes __MACOSX folders."""
-    macos_folders = glob.glob(f"{path}/**/__MACOSX", recursive=True)
-    for f in macos_folders:
-        shutil.rmtree(f)
+def is_macos_metadata(filename: str) -> bool:
+    """Whether a ZIP member belongs to a __MACOSX folder, which are never extracted."""
+    return "__MACOSX" in filename.replace("\\", "/").split("/")
 
 
 def flatten_folder(destination):
@@ -38,10 +60,179 @@ def flatten_folder(destination):
     if len(content) == 1:
         folder = os.path.join(destination, content[0])
         if os.path.isdir(folder):
-            log.debug(f"Flattening {folder}")
-            for f in os.listdir(folder):
-                shutil.move(os.path.join(folder, f), destination)
-            os.rmdir(folder)
+            log.debug("Flattening %s", folder)
+            # Move the folder aside first, in case it contains an item with its own name.
+            # It was extracted into `destination`, so a plain rename never crosses filesystems.
+            temp = f"{folder}.flatten"
+            os.rename(folder, temp)
+            with os.scandir(temp) as it:
+                for entry in it:
+                    os.rename(entry.path, os.path.join(destination, entry.name))
+            os.rmdir(temp)
+
+
+def _member_path(path: str, filename: str) -> str:
+    """
+    Resolve a ZIP member name inside `path` the way `ZipFile.extract` does:
+    drop drive letters, absolute and parent components, and on Windows replace
+    characters that are not allowed in file names.
+    """
+    arcname = filename.replace("\\", "/").replace("/", os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ("", os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(p for p in arcname.split(os.path.sep) if p not in invalid_path_parts)
+    if os.path.sep == "\\":
+        arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.path.sep)
+    return os.path.join(path, arcname) if arcname else path
+
+
+def extract_members(student_zip: zipfile.ZipFile, path: str) -> None:
+    """
+    Extract the files in `student_zip` into `path`.
+    Empty files, folders and __MACOSX metadata are skipped since they are never sent to MOSS.
+    """
+    os.makedirs(path, exist_ok=True)
+    for info in student_zip.infolist():
+        if info.is_dir() or info.file_size == 0 or is_macos_metadata(info.filename):
+            continue
+
+        destination = _member_path(path, info.filename)
+        if destination == path:
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        buffer_size = min(max(info.file_size, io.DEFAULT_BUFFER_SIZE), 1 << 20)
+        with student_zip.open(info) as src, open(destination, "wb", buffering=buffer_size) as dst:
+            shutil.copyfileobj(src, dst, buffer_size)
+
+
+# The Canvas ZIP file opened by each `unzip_with_zipfile` worker process.
+_canvas_zip: zipfile.ZipFile | None = None
+
+
+def _open_canvas_zip(canvas_zip: str) -> None:
+    """Worker initializer, opens the Canvas ZIP file once per process."""
+    global _canvas_zip
+    _canvas_zip = zipfile.ZipFile(canvas_zip, "r")
+
+
+def extract_student_zip(filename: str, path: str) -> None:
+    """
+    Extract a single student's ZIP file into `path`, then flatten the result.
+    Runs in a worker process, which reads the student's ZIP file from its own
+    handle on the Canvas ZIP file, so only one submission is in memory at a time.
+
+    :param filename: Name of the student's ZIP file inside the Canvas ZIP file.
+    :param path: Path to extract the student's ZIP file into.
+    :return: None
+    """
+    with _canvas_zip.open(filename) as b:
+        student_zip_file = io.BytesIO(b.read())
+    with zipfile.ZipFile(student_zip_file) as student_zip:
+        extract_members(student_zip, path)
+    flatten_folder(path)
+
+
+def extract_student_zips(filenames: list[str], path: str) -> None:
+    """Extract student ZIP files that share a folder one after another, like `extract_student_zip`."""
+    for filename in filenames:
+        extract_student_zip(filename, path)
+
+
+def extract_student_zip_libarchive(data: bytes, path: str) -> None:
+    """
+    Extract a single student's ZIP file into `path` with libarchive, then
+    flatten the result. libarchive releases the GIL while decompressing, so this
+    can run in a thread pool. Skips the same members as `extract_members`.
+
+    :param data: Raw bytes of the student's ZIP file.
+    :param path: Path to extract the student's ZIP file into.
+    :return: None
+    """
+    os.makedirs(path, exist_ok=True)
+    with libarchive.memory_reader(data) as archive:
+        for entry in archive:
+            if not entry.isreg or entry.size == 0 or is_macos_metadata(entry.pathname):
+                continue
+
+            destination = _member_path(path, entry.pathname)
+            if destination == path:
+                continue
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+            with open(destination, "wb") as f:
+                for block in entry.get_blocks():
+                    f.write(block)
+    flatten_folder(path)
+
+
+def run_unzip(zip_path: str, path: str) -> None:
+    """Extract `zip_path` into `path` with the `unzip` command line tool."""
+    # `*` also matches `/` in unzip patterns, so this skips __MACOSX folders at any depth.
+    result = subprocess.run(
+        ["unzip", "-qq", "-o", zip_path, "-d", path, "-x", "*__MACOSX/*"],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    # Exit code 1 only signals warnings, everything was still extracted.
+    # Exit code 11 means nothing matched, i.e. every member was excluded as __MACOSX metadata.
+    if result.returncode not in (0, 1, 11):
+        raise zipfile.BadZipFile(f"unzip failed on {zip_path} with exit code {result.returncode}: {result.stderr}")
+
+    # unzip cautions about the exclusion pattern whenever a ZIP has no __MACOSX folder.
+    warnings = [line for line in result.stderr.splitlines() if line and "excluded filename not matched" not in line]
+    if warnings:
+        log.debug("unzip warnings for %s: %s", zip_path, "\n".join(warnings))
+
+
+def unzip_student_zip(zip_path: str, path: str) -> None:
+    """
+    Extract a single student's ZIP file into `path` with the `unzip` command
+    line tool, then flatten the result.
+
+    :param zip_path: Path to the student's ZIP file.
+    :param path: Path to extract the student's ZIP file into.
+    :return: None
+    """
+    # unzip does not create `path` for a ZIP file without members.
+    os.makedirs(path, exist_ok=True)
+    run_unzip(zip_path, path)
+    flatten_folder(path)
+
+
+def unzip_student_zips(zip_paths: list[str], path: str) -> None:
+    """Extract student ZIP files that share a folder one after another, like `unzip_student_zip`."""
+    for zip_path in zip_paths:
+        unzip_student_zip(zip_path, path)
+
+
+def submission_folder_name(filename: str, original_name=False) -> str:
+    """Derive the folder to extract a submission into from its name in the Canvas ZIP file."""
+    res = _CANVAS_RE.match(filename)
+    if res is None:
+        log.warning("Could not parse the Canvas ZIP file, did the format change?")
+        return filename
+    return res[2] if original_name else res[1]
+
+
+def group_by_destination(submissions: Iterable[tuple[str, Any]], zip_output, original_name=False) -> dict[str, list]:
+    """
+    Map each extraction path to the submissions that go into it, keeping their order.
+    Several Canvas entries can share a folder, e.g. a student uploading more than one
+    ZIP file in an attempt, so each group must be extracted one submission at a time.
+
+    :param submissions: Pairs of the Canvas file name and what to hand to the extraction worker.
+    :param zip_output: Path to extract the ZIP files.
+    :param original_name: Whether to extract into folders with the original ZIP name.
+    :return: Extraction path to the submissions to extract into it.
+    """
+    groups: dict[str, list] = {}
+    for filename, submission in submissions:
+        folder_name = submission_folder_name(filename, original_name)
+        log.debug("Extracting %s", folder_name)
+        groups.setdefault(os.path.join(zip_output, folder_name), []).append(submission)
+    return groups
 
 
 def unzip_canvas_submission(canvas_zip, zip_output, original_name=False) -> None:
@@ -50,6 +241,9 @@ def unzip_canvas_submission(canvas_zip, zip_output, original_name=False) -> None
     Set `original_name` to `True` to keep student's ZIP file original name.
     This doesn't work consistently, notably with resubmissions.
 
+    Uses libarchive or the `unzip` command line tool when either is installed,
+    as both are much faster than `zipfile` on archives with many small files.
+
     :param canvas_zip: Path to ZIP file generated by Canvas
     :param zip_output: Path to extract the ZIP files.
     :param original_name: Whether to extract into folders with the original ZIP name.
@@ -62,27 +256,108 @@ def unzip_canvas_submission(canvas_zip, zip_output, original_name=False) -> None
         if os.listdir(zip_output):
             raise FileExistsError(f"{zip_output} is not empty.")
 
+    if libarchive is not None:
+        unzip_with_libarchive(canvas_zip, zip_output, original_name)
+    elif shutil.which("unzip"):
+        unzip_with_cli(canvas_zip, zip_output, original_name)
+    else:
+        unzip_with_zipfile(canvas_zip, zip_output, original_name)
+
+
+def unzip_with_libarchive(canvas_zip, zip_output, original_name=False) -> None:
+    """Unzip the Canvas submission with libarchive, one thread per submission folder."""
     with zipfile.ZipFile(canvas_zip, "r") as zf:
-        for submission in zf.infolist():
-            # Canvas ZIP name format (may contain -i
-            # at the end for resubmissions, where i is the attempt number):
-            # <last><first>_<canvas_id>_<sis_id>_<original_filename>[-i]
-            res = re.match(r"(\w+_\w*_\d+\d+)_(.+)\.", submission.filename)
-            try:
-                folder_name = res[2] if original_name else res[1]
-            except TypeError:  # if match returns None
-                log.warning("Could parse the Canvas ZIP file, did the format change?")
-                folder_name = submission.filename
 
-            log.debug(f"Extracting {folder_name}")
+        def extract(path: str, submissions: list[zipfile.ZipInfo]) -> None:
+            # Read inside the thread, so only the submissions being extracted are in memory.
+            for submission in submissions:
+                extract_student_zip_libarchive(zf.read(submission), path)
+
+        groups = group_by_destination(((info.filename, info) for info in zf.infolist()), zip_output, original_name)
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for _ in executor.map(extract, groups.keys(), groups.values()):
+                pass
+
+
+def unzip_with_cli(canvas_zip, zip_output, original_name=False) -> None:
+    """Unzip the Canvas submission with the `unzip` command line tool, one thread per submission folder."""
+    os.makedirs(zip_output, exist_ok=True)
+    # Unpack next to the output rather than into the system temp folder, which may be too small for large classes.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(zip_output))) as temp_dir:
+        run_unzip(canvas_zip, temp_dir)
+
+        entries = sorted(os.scandir(temp_dir), key=lambda e: e.name)
+        groups = group_by_destination(((e.name, e.path) for e in entries), zip_output, original_name)
+
+        # The work happens in `unzip` subprocesses, so threads are enough to run them in parallel.
+        with ThreadPool(os.cpu_count()) as pool:
+            pool.starmap(unzip_student_zips, ((zip_paths, path) for path, zip_paths in groups.items()))
+
+
+def unzip_with_zipfile(canvas_zip, zip_output, original_name=False) -> None:
+    """Unzip the Canvas submission with `zipfile`, one worker process per submission folder."""
+    with zipfile.ZipFile(canvas_zip, "r") as zf:
+        groups = group_by_destination(
+            ((info.filename, info.filename) for info in zf.infolist()), zip_output, original_name
+        )
+
+    # Each submission folder is independent, so decompress them in parallel.
+    # Workers read their submissions themselves rather than receiving the bytes.
+    with ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=_open_canvas_zip, initargs=(canvas_zip,)
+    ) as executor:
+        for _ in executor.map(extract_student_zips, groups.values(), groups.keys(), chunksize=4):
+            pass
+
+
+def _walk(folder: str, depth=0) -> Iterator[os.DirEntry]:
+    """
+    Recursively yield every regular file under `folder`, skipping hidden entries
+    like `glob` does. Folders in `SKIP_DIRS` are pruned without being read, except
+    directly under the root, where they are submission folders, e.g. `build.zip`
+    extracted with `--original-name`.
+    """
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if depth == 0 or entry.name not in SKIP_DIRS:
+                    yield from _walk(entry.path, depth + 1)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+@functools.lru_cache(maxsize=None)
+def _build_tree(root: str) -> tuple[tuple[str, os.DirEntry], ...]:
+    """
+    Walk `root` once and cache the files found, along with their extensions.
+    The extracted submissions do not change while the script runs, so repeated
+    batches can reuse the same walk. Each `DirEntry` also caches its own `stat`
+    result after the first call.
+    """
+    return tuple((os.path.splitext(entry.name)[1], entry) for entry in _walk(root))
 
-            b = zf.open(submission, "r")
-            with zipfile.ZipFile(b) as student_zip:
-                path = os.path.join(zip_output, folder_name)
 
-                student_zip.extractall(path=path)
-                cleanup_files(path)
-                flatten_folder(path)
+def list_entries(folder: str, language="") -> list[os.DirEntry]:
+    """
+    List files from the provided folder as `DirEntry` objects, which keep their
+    cached `stat` result. If `language` is provided, the resulting list will
+    only contain files that match the extension of the language.
+    """
+    extensions = _LANGUAGE_EXTENSION_SETS.get(language.lower(), frozenset())
+
+    files = []
+    for ext, entry in _build_tree(folder):
+        # Cheap string checks first, `stat` only for files we would keep.
+        if entry.name.endswith(IGNORED_EXTENSIONS):
+            continue
+        if ext not in extensions:
+            continue
+        if entry.stat().st_size == 0:
+            continue
+        files.append(entry)
+    return files
 
 
 def list_files(folder: str, language="") -> list[str]:
@@ -91,15 +366,42 @@ def list_files(folder: str, language="") -> list[str]:
     resulting list will only contain files that match the extension of the
     language.
     """
-    files = []
-    for ext in LANGUAGE_EXTENSIONS.get(language.lower(), ""):
-        files += glob.glob(f"{folder}/**/*{ext}", recursive=True)
+    return [entry.path for entry in list_entries(folder, language)]
+
 
-    new_files = []
-    for f in files:
-        if os.path.isfile(f) and not f.endswith("pdf") and not f.endswith("jar") and os.path.getsize(f) > 0:
-            new_files.append(f)
-    return new_files
+def group_by_submission(entries: list[os.DirEntry], zip_output: str) -> dict[str, list[os.DirEntry]]:
+    """Group files listed from `zip_output` by the name of the submission folder they are in."""
+    prefix = os.path.join(zip_output, "")
+    by_folder: dict[str, list[os.DirEntry]] = {}
+    for entry in entries:
+        by_folder.setdefault(entry.path[len(prefix) :].split(os.sep, 1)[0], []).append(entry)
+    return by_folder
+
+
+def order_for_upload(entries: Iterable[os.DirEntry]) -> list[str]:
+    """
+    Drop files listed more than once, such as solutions kept inside the
+    submissions folder, and put the largest files first. Sizes come from the
+    `stat` result cached on each entry.
+    """
+    unique = {}
+    for entry in entries:
+        unique.setdefault(os.path.normcase(os.path.realpath(entry.path)), entry)
+    return [entry.path for entry in sorted(unique.values(), key=lambda e: e.stat().st_size, reverse=True)]
+
+
+class BatchMoss(mosspy.Moss):
+    """
+    `mosspy.Moss` that can add many files at once. Files are expected to come
+    from `list_files`, which already drops missing and empty files, so the
+    per-file checks done by `addFile` are skipped.
+    """
+
+    def addFiles(self, file_paths: Iterable[str]) -> None:
+        self.files.extend((f, None) for f in file_paths)
+
+    def addBaseFiles(self, file_paths: Iterable[str]) -> None:
+        self.base_files.extend((f, None) for f in file_paths)
 
 
 def create_moss_comments(**kwargs) -> str:
@@ -122,41 +424,41 @@ def stage_moss_files(
     max_submissions=0,
     base_files=None,
     solutions=None,
-) -> mosspy.Moss:
-    moss = mosspy.Moss(user_id=None, language=language)
+) -> BatchMoss:
+    moss = BatchMoss(user_id=None, language=language)
 
-    files = []
+    # List every submission in one walk, then pick the batch from it.
+    entries = list_entries(zip_output, language)
     submission_folders = []
 
     if max_submissions:
-        folders = glob.glob(f"{zip_output}/*", recursive=True)
-        random.shuffle(folders)
-        submission_folders = folders[:max_submissions]
+        with os.scandir(zip_output) as it:
+            folders = [entry.path for entry in it if entry.is_dir() and not entry.name.startswith(".")]
+        submission_folders = random.sample(folders, min(max_submissions, len(folders)))
+
+        by_folder = group_by_submission(entries, zip_output)
+        entries = list(
+            itertools.chain.from_iterable(by_folder.get(os.path.basename(folder), ()) for folder in submission_folders)
+        )
     else:
         submission_folders = [zip_output]
 
-    for folder in submission_folders:
-        files += list_files(folder, language)
-
-    for f in files:
-        moss.addFile(f)
-
-    if not files:
+    if not entries:
         raise FileNotFoundError("No files to upload. Checked the provided ZIP file and language")
 
     if base_files:
         files = list_files(base_files, language)
         if not files:
             raise FileNotFoundError(f"{base_files} returned no matches for base files")
-        for f in files:
-            moss.addBaseFile(f)
+        moss.addBaseFiles(files)
 
+    solution_entries = []
     if solutions:
-        files = list_files(solutions, language)
-        if not files:
+        solution_entries = list_entries(solutions, language)
+        if not solution_entries:
             raise FileNotFoundError(f"{solutions} returned no matches for online solutions")
-        for f in files:
-            moss.addFile(f)
+
+    moss.addFiles(order_for_upload(itertools.chain(entries, solution_entries)))
 
     moss.setCommentString(
         create_moss_comments(
@@ -171,28 +473,66 @@ def stage_moss_files(
     return moss
 
 
-def send_to_moss(moss: mosspy.Moss, report_path: str, user_id=None, no_report=False, count=1):
+def upload_progress(total: int, every=100) -> Callable[[str, str], None]:
+    """Build a callback for `Moss.send` that logs upload progress every `every` files, instead of once per file."""
+    uploaded = itertools.count(1)
+
+    def on_send(file_path, display_name):
+        n = next(uploaded)
+        if n % every == 0 or n == total:
+            log.info("Uploaded %d/%d files", n, total)
+
+    return on_send
+
+
+def send_to_moss(moss: mosspy.Moss, user_id=None, count=1) -> str:
     moss.user_id = user_id or os.getenv("MOSS_ID") or MOSS_ID
 
     if not moss.user_id:
         raise ValueError("No MOSS ID found")
 
-    log.debug(f"Sending to MOSS with: {pprint.pformat(moss.__dict__)}")
-    url = moss.send(lambda file_path, _: log.debug(f"Uploading: {file_path}"))
-    log.info("Report URL: " + url)
-
-    log.info("Saving report page")
-    Path(report_path).mkdir(parents=True, exist_ok=True)
+    if log.isEnabledFor(logging.DEBUG):
+        # The file lists can hold thousands of entries, only log their sizes.
+        summary = {
+            **moss.__dict__,
+            "files": f"<{len(moss.files)} files>",
+            "base_files": f"<{len(moss.base_files)} files>",
+        }
+        log.debug("Sending to MOSS with: %s", pprint.pformat(summary))
+    url = moss.send(upload_progress(len(moss.base_files) + len(moss.files)))
+    log.info("Report URL for batch %d: %s", count, url)
+    return url
+
+
+def save_moss_report(moss: mosspy.Moss, url: str, report_path: str, no_report=False, count=1):
+    log.info("Saving report page for batch %d", count)
     moss.saveWebPage(url, f"{report_path}/report{count}.html")
 
     if no_report:
         return
 
-    log.info("Downloading report")
-    Path(f"{report_path}/report{count}").mkdir(parents=True, exist_ok=True)
+    log.info("Downloading report for batch %d", count)
+    # `report_path` itself is created once in `main`.
+    try:
+        os.mkdir(f"{report_path}/report{count}")
+    except FileExistsError:
+        pass
     mosspy.download_report(url, f"{report_path}/report{count}", connections=8, log_level=log.level)
 
 
+def submit_batch(opt: argparse.Namespace, count: int) -> tuple[mosspy.Moss, str]:
+    """Stage a random batch of submissions and send it to MOSS, returning the report URL."""
+    log.info("Sending batch %d/%d to MOSS", count, opt.repeat)
+    moss = stage_moss_files(
+        zip_output=opt.zip_output,
+        language=opt.language,
+        max_submissions=opt.max_submissions,
+        base_files=opt.base_files,
+        solutions=opt.solutions,
+    )
+    return moss, send_to_moss(moss=moss, user_id=opt.moss_id, count=count)
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Utility for unzipping Canvas submission and uploading files to MOSS.")
 
@@ -286,7 +626,8 @@ def parse_args():
 
 
 def setup_logger():
-    file_handler = logging.FileHandler(filename=f"mos_moss_{datetime.now().isoformat()}.log", mode="w")
+    # Only create the log file once something is actually logged to it.
+    file_handler = logging.FileHandler(filename=f"mos_moss_{datetime.now().isoformat()}.log", mode="w", delay=True)
     logging.basicConfig(
         level=logging.DEBUG,
         format="%(asctime)s [%(threadName)s] [%(levelname)s] %(message)s",
@@ -299,7 +640,8 @@ def main():
 
     setup_logger()
     log.setLevel(logging.DEBUG if opt.verbose else logging.INFO)
-    log.debug(f"CLI options: {pprint.pformat(opt.__dict__)}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("CLI options: %s", pprint.pformat(opt.__dict__))
 
     unzip_canvas_submission(
         canvas_zip=opt.zip_file,
@@ -311,19 +653,34 @@ def main():
         log.info("Extract only mode. Stopping.")
         return
 
-    for n in range(1, opt.repeat + 1):
-        log.info(f"Sending batch {n}/{opt.repeat} to MOSS")
-        moss = stage_moss_files(
-            zip_output=opt.zip_output,
-            language=opt.language,
-            max_submissions=opt.max_submissions,
-            base_files=opt.base_files,
-            solutions=opt.solutions,
-        )
-        send_to_moss(
-            moss=moss,
-            report_path=opt.report_output,
-            user_id=opt.moss_id,
-            no_report=opt.no_report,
-            count=n,
-        )
+    Path(opt.report_output).mkdir(parents=True, exist_ok=True)
+
+    # Walk the submissions once up front. `lru_cache` does not lock on a miss,
+    # so concurrent batches would otherwise each walk the tree themselves.
+    list_entries(opt.zip_output, opt.language)
+
+    # Batches mostly wait on the network, so send a few at once and start
+    # downloading each report as soon as its batch comes back from MOSS.
+    # Reports get their own pool so they do not queue behind unsent batches.
+    # Both are kept small to avoid flooding the shared MOSS server with connections.
+    workers = max(1, min(opt.repeat, 4))
+    with (
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as senders,
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as downloaders,
+    ):
+        batches = {senders.submit(submit_batch, opt, n): n for n in range(1, opt.repeat + 1)}
+        reports = []
+        for future in as_completed(batches):
+            moss, url = future.result()
+            reports.append(
+                downloaders.submit(
+                    save_moss_report,
+                    moss=moss,
+                    url=url,
+                    report_path=opt.report_output,
+                    no_report=opt.no_report,
+                    count=batches[future],
+                )
+            )
+        for future in reports:
+            future.result()